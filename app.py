@@ -1,5 +1,9 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify, send_file, session
+import json
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, jsonify, send_file, session, stream_with_context
 from werkzeug.utils import secure_filename
 from dotenv import load_dotenv
 import uuid
@@ -8,7 +12,9 @@ import uuid
 from config import Config
 from rag_handler import RAGHandler
 from pdf_formatter import create_enhanced_pdf_summary
-from utils import allowed_file, get_available_files, get_downloads_files, extract_file_operation, format_response_with_links
+from utils import (allowed_file, get_available_files, get_downloads_files, extract_file_operation,
+                   format_response_with_links, register_upload, unregister_upload, start_upload_watcher,
+                   mentions_file)
 from memory_manager import MemoryManager
 
 # Load environment variables
@@ -20,6 +26,55 @@ app.config.from_object(Config)
 # Initialize components
 memory_manager = MemoryManager()
 rag_handler = RAGHandler()
+app.config['RAG'] = rag_handler
+
+
+def start_background_tasks():
+    """
+    Start threads that must run in the serving process. Called by each entry
+    point after any fork, since threads started in a Gunicorn master do not
+    survive into its workers.
+    """
+    if Config.WATCH_UPLOADS:
+        start_upload_watcher()
+
+# Background ingestion so uploads return without waiting for indexing
+INGEST_POOL = ThreadPoolExecutor(max_workers=Config.INGEST_WORKERS)
+# Unfinished or failed ingests by filename; successful ones are dropped when they finish
+INGEST_FUTURES = {}
+INGEST_FUTURES_LOCK = threading.Lock()
+
+
+def submit_ingest(file_path, filename):
+    """Queue a newly uploaded file for background indexing."""
+    def finish(future):
+        if future.exception():
+            # Keep failures so /ingest-status can report them
+            print(f"Error indexing {filename}: {future.exception()}")
+            return
+        with INGEST_FUTURES_LOCK:
+            # A re-upload may have replaced this entry with a newer ingest
+            if INGEST_FUTURES.get(filename) is future:
+                del INGEST_FUTURES[filename]
+    
+    future = INGEST_POOL.submit(rag_handler.ingest_file, file_path, filename)
+    with INGEST_FUTURES_LOCK:
+        INGEST_FUTURES[filename] = future
+    # Registered after the insert, so a fast ingest still removes its own entry
+    future.add_done_callback(finish)
+    return future
+
+
+def wait_for_relevant_ingests(question):
+    """Wait briefly for unfinished ingests of files the question mentions."""
+    with INGEST_FUTURES_LOCK:
+        ingests = list(INGEST_FUTURES.items())
+    pending = [
+        future for filename, future in ingests
+        if not future.done() and mentions_file(question, filename)
+    ]
+    if pending:
+        wait(pending, timeout=Config.INGEST_WAIT_TIMEOUT)
 
 
 def get_session_id():
@@ -37,7 +92,7 @@ def index():
 
 
 @app.route('/upload', methods=['POST'])
-def upload_file():
+async def upload_file():
     """Handles the file upload and text extraction."""
     print(f"Upload request received. Files: {request.files}")
     print(f"Form data: {request.form}")
@@ -61,12 +116,13 @@ def upload_file():
         filename = secure_filename(file.filename)
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
         print(f"Saving file to: {file_path}")
-        file.save(file_path)
+        await asyncio.to_thread(file.save, file_path)
+        register_upload(filename)
 
-        # Reset the vector store to rebuild it with new file
-        rag_handler.reset_vectorstore()
+        # Index only the new file, in the background
+        submit_ingest(file_path, filename)
 
-        flash(f'File {filename} uploaded successfully! The document will now be processed for RAG.')
+        flash(f'File {filename} uploaded successfully! The document is being processed for RAG in the background.')
         return redirect(url_for('index'))
     else:
         print(f"File validation failed. File: {file}, allowed_file: {allowed_file(file.filename) if file else 'No file'}")
@@ -74,6 +130,25 @@ def upload_file():
         return redirect(url_for('index'))
 
 
+@app.route('/ingest-status/<filename>')
+def ingest_status(filename):
+    """Report whether an uploaded file has finished indexing."""
+    with INGEST_FUTURES_LOCK:
+        future = INGEST_FUTURES.get(filename)
+    if future is None:
+        # Finished ingests are not tracked; the persisted manifest records them
+        if rag_handler.is_indexed(filename):
+            return jsonify({'filename': filename, 'done': True, 'error': None})
+        return jsonify({'error': 'No ingest found for this file'}), 404
+    
+    error = future.exception() if future.done() else None
+    return jsonify({
+        'filename': filename,
+        'done': future.done(),
+        'error': str(error) if error else None
+    })
+
+
 @app.route('/chat')
 def chat():
     """Renders the chat interface."""
@@ -83,11 +158,11 @@ def chat():
 
 
 @app.route('/download/<filename>')
-def download_file(filename):
+async def download_file(filename):
     """Download original PDF file."""
     try:
         file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        if os.path.exists(file_path):
+        if await asyncio.to_thread(os.path.exists, file_path):
             return send_file(file_path, as_attachment=True)
         else:
             return jsonify({'error': 'File not found'}), 404
@@ -96,11 +171,11 @@ def download_file(filename):
 
 
 @app.route('/download-summary/<filename>')
-def download_summary(filename):
+async def download_summary(filename):
     """Download generated summary PDF."""
     try:
         summary_path = os.path.join(app.config['DOWNLOAD_FOLDER'], filename)
-        if os.path.exists(summary_path):
+        if await asyncio.to_thread(os.path.exists, summary_path):
             return send_file(summary_path, as_attachment=True)
         else:
             return jsonify({'error': 'Summary file not found'}), 404
@@ -166,13 +241,15 @@ def delete_file():
     try:
         if folder == 'uploads':
             file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            # Reset vector store when deleting from uploads
-            rag_handler.reset_vectorstore()
         else:
             file_path = os.path.join(app.config['DOWNLOAD_FOLDER'], filename)
         
         if os.path.exists(file_path):
             os.remove(file_path)
+            if folder == 'uploads':
+                unregister_upload(filename)
+                # Drop the deleted file's chunks from the vector store
+                rag_handler.remove_file(filename)
             return jsonify({'status': 'File deleted successfully'})
         else:
             return jsonify({'error': 'File not found'}), 404
@@ -181,8 +258,49 @@ def delete_file():
         return jsonify({'error': str(e)}), 500
 
 
+def process_ai_response(ai_response):
+    """
+    Extract file operations and the clean answer from an AI response and
+    prepare any requested downloads.
+    """
+    # Extract file operations from response
+    operations = extract_file_operation(ai_response)
+    
+    # Extract the actual answer (everything after ANSWER:)
+    answer_parts = ai_response.split('ANSWER:', 1)
+    clean_answer = answer_parts[1].strip() if len(answer_parts) > 1 else ai_response
+    
+    # Handle file operations
+    download_links = {}
+    
+    if operations['download_original'] and operations['filename']:
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], operations['filename'])
+        if os.path.exists(file_path):
+            download_links['original'] = f"/download/{operations['filename']}"
+    
+    if operations['download_summary'] and operations['filename'] and operations['summary_content']:
+        try:
+            summary_path = create_enhanced_pdf_summary(
+                operations['summary_content'], 
+                operations['filename']
+            )
+            summary_filename = os.path.basename(summary_path)
+            download_links['summary'] = f"/download-summary/{summary_filename}"
+        except Exception as e:
+            print(f"Error creating summary PDF: {e}")
+    
+    # Format response with download links for display
+    formatted_response = format_response_with_links(clean_answer, download_links)
+    
+    return clean_answer, {
+        'response': formatted_response,
+        'downloads': download_links,
+        'operations': operations
+    }
+
+
 @app.route('/ask', methods=['POST'])
-def ask_question():
+async def ask_question():
     """
     Handles the user's question and provides a RAG-based answer with file operations.
     """
@@ -192,55 +310,28 @@ def ask_question():
     if not question:
         return jsonify({'response': "Please enter a question."})
 
+    # Give in-flight ingests of files the question refers to a chance to finish
+    await asyncio.to_thread(wait_for_relevant_ingests, question)
+
     # Ensure the vector store is built
-    if not rag_handler.initialize():
+    if not await asyncio.to_thread(rag_handler.initialize):
         return jsonify({'response': "Please upload and process at least one PDF file first."})
 
     # Get conversation context
-    conversation_context = memory_manager.get_conversation_context(session_id)
+    conversation_context = await asyncio.to_thread(memory_manager.get_conversation_context, session_id)
     
     try:
         # Get response from RAG handler
-        ai_response = rag_handler.get_response(question, conversation_context)
-        
-        # Extract file operations from response
-        operations = extract_file_operation(ai_response)
-        
-        # Extract the actual answer (everything after ANSWER:)
-        answer_parts = ai_response.split('ANSWER:', 1)
-        clean_answer = answer_parts[1].strip() if len(answer_parts) > 1 else ai_response
-        
-        # Handle file operations
-        download_links = {}
+        ai_response = await rag_handler.aget_response(question, conversation_context)
         
-        if operations['download_original'] and operations['filename']:
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], operations['filename'])
-            if os.path.exists(file_path):
-                download_links['original'] = f"/download/{operations['filename']}"
-        
-        if operations['download_summary'] and operations['filename'] and operations['summary_content']:
-            try:
-                summary_path = create_enhanced_pdf_summary(
-                    operations['summary_content'], 
-                    operations['filename']
-                )
-                summary_filename = os.path.basename(summary_path)
-                download_links['summary'] = f"/download-summary/{summary_filename}"
-            except Exception as e:
-                print(f"Error creating summary PDF: {e}")
-        
-        # Format response with download links for display
-        formatted_response = format_response_with_links(clean_answer, download_links)
+        # PDF summary rendering is blocking, so keep it off the event loop
+        clean_answer, result = await asyncio.to_thread(process_ai_response, ai_response)
         
         # Add to conversation memory
         memory_manager.add_to_memory(session_id, question, clean_answer)
         
-        return jsonify({
-            'response': formatted_response,
-            'downloads': download_links,
-            'operations': operations,
-            'session_id': session_id
-        })
+        result['session_id'] = session_id
+        return jsonify(result)
         
     except Exception as e:
         print(f"Error during processing: {e}")
@@ -249,6 +340,60 @@ def ask_question():
         return jsonify({'response': error_response})
 
 
+def sse_event(data, event=None):
+    """Format a Server-Sent Events frame with a JSON payload."""
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {json.dumps(data)}\n\n"
+
+
+@app.route('/ask-stream', methods=['POST'])
+def ask_question_stream():
+    """
+    Streams the RAG-based answer token by token as Server-Sent Events,
+    followed by a final 'done' event with the same payload as /ask.
+    """
+    question = request.json.get('question', '')
+    session_id = get_session_id()
+
+    if not question:
+        return Response(sse_event({'response': "Please enter a question."}, 'done'),
+                        mimetype='text/event-stream')
+
+    # Give in-flight ingests of files the question refers to a chance to finish
+    wait_for_relevant_ingests(question)
+
+    # Ensure the vector store is built
+    if not rag_handler.initialize():
+        return Response(sse_event({'response': "Please upload and process at least one PDF file first."}, 'done'),
+                        mimetype='text/event-stream')
+
+    # Get conversation context
+    conversation_context = memory_manager.get_conversation_context(session_id)
+
+    def generate():
+        tokens = []
+        try:
+            for token in rag_handler.stream_response(question, conversation_context):
+                tokens.append(token)
+                yield sse_event({'token': token})
+            
+            clean_answer, result = process_ai_response(''.join(tokens))
+            
+            # Only write back to memory once the full answer has arrived
+            memory_manager.add_to_memory(session_id, question, clean_answer)
+            
+            result['session_id'] = session_id
+            yield sse_event(result, 'done')
+            
+        except Exception as e:
+            print(f"Error during processing: {e}")
+            error_response = "Sorry, an error occurred while processing your request."
+            memory_manager.add_to_memory(session_id, question, error_response)
+            yield sse_event({'response': error_response}, 'done')
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
+
 if __name__ == '__main__':
     # Initialize the RAG handler on startup (optional - will be initialized when needed)
     try:
@@ -258,4 +403,5 @@ if __name__ == '__main__':
         print(f"RAG handler initialization failed on startup: {e}")
         print("PDF-IQ will be initialized when first needed.")
     
+    start_background_tasks()
     app.run(debug=True, port=5050)
\ No newline at end of file
@@ -0,0 +1,116 @@
+import threading
+from typing import Any, List
+
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from config import Config
+
+# Number of set bits in each byte value, for Hamming distances over packed codes
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+class BinaryIndex:
+    """
+    Sign-bit codes (1 bit per dimension) for every chunk in a Chroma
+    collection, rebuilt when the collection's size changes.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._lock = threading.Lock()
+        self._count = None
+        self._ids = []
+        self._codes = None
+        self._filenames = None
+
+    def invalidate(self):
+        """Force a rebuild on the next search."""
+        with self._lock:
+            self._count = None
+
+    def _refresh(self):
+        """Rebuild the codes from the stored embeddings if the collection changed."""
+        count = self.collection.count()
+        if count == self._count:
+            return
+
+        data = self.collection.get(include=['embeddings', 'metadatas'])
+        if not data['ids']:
+            self._ids, self._codes, self._filenames = [], None, None
+            self._count = count
+            return
+
+        vectors = np.asarray(data['embeddings'], dtype=np.float32).reshape(len(data['ids']), -1)
+        self._ids = data['ids']
+        self._codes = np.packbits(vectors > 0, axis=1)
+        self._filenames = np.array([metadata.get('source_filename') for metadata in data['metadatas']])
+        self._count = count
+
+    def shortlist(self, query_vector, size, filenames=None):
+        """Return the IDs of the chunks closest to the query in Hamming distance."""
+        query_code = np.packbits(np.asarray(query_vector) > 0)
+
+        with self._lock:
+            self._refresh()
+            if not self._ids:
+                return []
+
+            candidates = np.arange(len(self._ids))
+            if filenames:
+                candidates = np.flatnonzero(np.isin(self._filenames, filenames))
+            if not len(candidates):
+                return []
+
+            distances = _POPCOUNT[self._codes[candidates] ^ query_code].sum(axis=1, dtype=np.int32)
+            if len(candidates) > size:
+                candidates = candidates[np.argpartition(distances, size - 1)[:size]]
+            return [self._ids[i] for i in candidates]
+
+
+def _filter_filenames(where):
+    """Extract the filenames from a source_filename filter, as built by RAGHandler."""
+    if not where:
+        return None
+    condition = where.get('source_filename')
+    if isinstance(condition, dict):
+        return list(condition.get('$in', []))
+    return [condition]
+
+
+class BinaryQuantizedRetriever(BaseRetriever):
+    """
+    Retriever that shortlists candidates by Hamming distance between binary
+    codes, then rescores the shortlist with exact cosine similarity.
+    """
+
+    index: Any
+    embeddings: Any
+    search_kwargs: dict = {}
+    shortlist_size: int = Config.RETRIEVER_BINARY_SHORTLIST
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        k = self.search_kwargs.get('k', 4)
+        filenames = _filter_filenames(self.search_kwargs.get('filter'))
+
+        query_vector = np.asarray(self.embeddings.embed_query(query), dtype=np.float32)
+        ids = self.index.shortlist(query_vector, self.shortlist_size, filenames)
+        if not ids:
+            return []
+
+        data = self.index.collection.get(ids=ids, include=['embeddings', 'documents', 'metadatas'])
+        if not data['ids']:
+            return []
+
+        # Stored and query embeddings are normalized, so the dot product is the cosine similarity
+        vectors = np.asarray(data['embeddings'], dtype=np.float32).reshape(len(data['ids']), -1)
+        scores = vectors @ query_vector
+        top = np.argsort(-scores)[:k]
+        return [
+            Document(page_content=data['documents'][i], metadata=data['metadatas'][i])
+            for i in top
+        ]
@@ -34,17 +34,55 @@ class Config:
     UPLOAD_FOLDER = 'uploads'
     DOWNLOAD_FOLDER = 'downloads'
     VECTORSTORE_FOLDER = 'vectorstore'
+    VECTORSTORE_COLLECTION = 'pdfs'
+    VECTORSTORE_MANIFEST = os.path.join(VECTORSTORE_FOLDER, 'manifest.json')
+    CHROMA_BATCH_SIZE = 256  # a whole number of embedding micro-batches
+    INGEST_WORKERS = 2
+    INGEST_WAIT_TIMEOUT = 10  # seconds /ask waits for a relevant in-flight ingest
     
     # File settings
     ALLOWED_EXTENSIONS = {'pdf'}
     MAX_CONTENT_LENGTH = 50 * 1024 * 1024  # 50MB max file size
+    WATCH_UPLOADS = os.getenv('WATCH_UPLOADS', 'false').lower() == 'true'  # requires watchdog
     
     # RAG settings
-    CHUNK_SIZE = 1000
-    CHUNK_OVERLAP = 200
+    CHUNK_SIZE = 254  # embedding-model tokens; + [CLS]/[SEP] fills MiniLM's 256-token window
+    CHUNK_OVERLAP = 32  # tokens
     MAX_MEMORY_SIZE = 20
     EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+    EMBEDDING_MAX_TOKENS = 256  # the model's max_seq_length in sentence-transformers
+    EMBEDDING_BATCH_SIZE = 64
+    EMBEDDING_BATCH_SIZE_GPU = 256
+    # Processes that embed at once; each gets an equal share of the cores
+    WEB_WORKERS = 1  # Gunicorn workers, see gunicorn.conf.py
+    EMBEDDING_THREADS = int(os.getenv('PDFIQ_THREADS', max(1, (os.cpu_count() or 4) // WEB_WORKERS)))  # CPU intra-op threads
+    EMBEDDING_COMPILE = os.getenv('EMBEDDING_COMPILE', 'false').lower() == 'true'
+    EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'huggingface')  # 'huggingface' or 'onnx'
+    ONNX_MODEL_DIR = os.path.join('onnx', 'minilm-int8')
     LLM_MODEL = "deepseek-chat"
+    LLM_MAX_CONNECTIONS = 20
+    
+    # Retrieval settings (HNSW parameters only apply when a collection is created)
+    VECTORSTORE_HNSW = {
+        "hnsw:space": "cosine",
+        "hnsw:M": 32,
+        "hnsw:construction_ef": 200,
+        "hnsw:search_ef": 64
+    }
+    RETRIEVER_SEARCH_TYPE = "mmr"
+    RETRIEVER_SEARCH_KWARGS = {"k": 3, "fetch_k": 20, "lambda_mult": 0.5}
+    RETRIEVER_BINARY_QUANTIZATION = os.getenv('RETRIEVER_BINARY_QUANTIZATION', 'false').lower() == 'true'
+    RETRIEVER_BINARY_SHORTLIST = 200  # candidates rescored with exact cosine
+    
+    # Cache settings
+    QA_CACHE_SIZE = 1000  # answered questions kept per worker
+    QA_CACHE_MIN_SIMILARITY = 0.95  # cosine similarity
+    QA_CACHE_TTL = 300  # seconds
+    LLM_CACHE_PATH = os.path.join(VECTORSTORE_FOLDER, 'llm_cache.db')
+    EMBEDDING_CACHE_PATH = os.path.join(VECTORSTORE_FOLDER, 'embedding_cache.db')
+    
+    # Chat memory, shared by all workers and kept across restarts
+    MEMORY_DB_PATH = os.path.join(VECTORSTORE_FOLDER, 'chat_memory.db')
     
     @staticmethod
     def init_directories():
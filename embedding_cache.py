@@ -0,0 +1,66 @@
+import hashlib
+import sqlite3
+from contextlib import closing
+
+import numpy as np
+
+from config import Config
+
+
+class EmbeddingCache:
+    """SQLite cache of chunk embeddings keyed by a hash of the text and model."""
+
+    # Keep IN (...) queries under SQLite's bound-parameter limit
+    QUERY_BATCH_SIZE = 500
+
+    def __init__(self, db_path=Config.EMBEDDING_CACHE_PATH, model_id=None):
+        self.db_path = db_path
+        self.model_id = model_id or f"{Config.EMBEDDING_BACKEND}:{Config.EMBEDDING_MODEL}"
+        with closing(self._connect()) as conn, conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS cache (hash BLOB PRIMARY KEY, vec BLOB)")
+
+    def _connect(self):
+        """Open a new connection, so the cache can be used from worker threads."""
+        return sqlite3.connect(self.db_path)
+
+    def _hash(self, text):
+        """Hash a chunk together with the model ID."""
+        return hashlib.sha256((text + self.model_id).encode('utf-8')).digest()
+
+    def _lookup(self, conn, hashes):
+        """Fetch cached vectors for the given hashes."""
+        found = {}
+        for start in range(0, len(hashes), self.QUERY_BATCH_SIZE):
+            batch = hashes[start:start + self.QUERY_BATCH_SIZE]
+            placeholders = ', '.join('?' * len(batch))
+            rows = conn.execute(f"SELECT hash, vec FROM cache WHERE hash IN ({placeholders})", batch)
+            for key, blob in rows:
+                found[key] = np.frombuffer(blob, dtype=np.float16).astype(np.float32).tolist()
+        return found
+
+    def embed_documents(self, texts, embeddings):
+        """Embed texts, calling the embedder only for chunks not already cached."""
+        hashes = [self._hash(text) for text in texts]
+
+        with closing(self._connect()) as conn, conn:
+            cached = self._lookup(conn, hashes)
+
+            # Embed each distinct uncached chunk once
+            missing = {}
+            for i, key in enumerate(hashes):
+                if key not in cached and key not in missing:
+                    missing[key] = texts[i]
+
+            if missing:
+                new_vectors = embeddings.embed_documents(list(missing.values()))
+                # float16 halves the on-disk size of each vector
+                conn.executemany(
+                    "INSERT OR IGNORE INTO cache (hash, vec) VALUES (?, ?)",
+                    [(key, np.asarray(vec, dtype=np.float16).tobytes())
+                     for key, vec in zip(missing, new_vectors)]
+                )
+                for key, vec in zip(missing, new_vectors):
+                    cached[key] = list(vec)
+
+        print(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} misses.")
+        return [cached[key] for key in hashes]
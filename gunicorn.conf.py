@@ -1,15 +1,22 @@
 # Gunicorn configuration file for PDF-IQ
-import multiprocessing
 import os
 
+from config import Config
+
 # Server socket
 bind = "0.0.0.0:5050"
 backlog = 2048
 
-# Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
-worker_connections = 1000
+wsgi_app = "app:app"
+
+# A single worker process, serving requests from a thread pool so one slow LLM
+# call does not block the rest. It must stay at one: uploads and deletes write to
+# Chroma's PersistentClient, which is not process-safe, and other workers would
+# keep serving the collection they opened at fork without the new chunks.
+workers = Config.WEB_WORKERS
+worker_class = "gthread"
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+# gthread workers heartbeat from the main thread, so a slow LLM call no longer trips this
 timeout = 30
 keepalive = 2
 
@@ -45,5 +52,29 @@ raw_env = [
 # Preload app for better performance
 preload_app = True
 
+
+def on_starting(server):
+    """Index new uploads once, before any worker is started (in a child of the master)."""
+    if server.num_workers != Config.WEB_WORKERS:
+        # Also overrides -w/--workers on the command line; see the note on workers above
+        server.log.warning(f"PDF-IQ supports {Config.WEB_WORKERS} worker(s), not {server.num_workers}.")
+        server.num_workers = Config.WEB_WORKERS
+    
+    from app import rag_handler
+    try:
+        rag_handler.preload()
+    except Exception as e:
+        server.log.warning(f"Could not preload the PDF-IQ vector store: {e}")
+
+
+def post_fork(server, worker):
+    """Open the already indexed vector store in each worker (the embedder loads when first needed)."""
+    from app import rag_handler, start_background_tasks
+    start_background_tasks()
+    try:
+        rag_handler.open_indexed()
+    except Exception as e:
+        server.log.warning(f"Could not open the PDF-IQ vector store in worker {worker.pid}: {e}")
+
 # Worker timeout for graceful shutdown
 graceful_timeout = 30
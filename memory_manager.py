@@ -1,53 +1,75 @@
-import os
-from collections import deque
+import sqlite3
+from contextlib import closing
 from config import Config
 
 
 class MemoryManager:
-    """Manages chat memory for different sessions."""
+    """Manages chat memory for different sessions, shared by all workers through SQLite."""
     
-    def __init__(self):
-        self.chat_memory = {}
+    def __init__(self, db_path=Config.MEMORY_DB_PATH):
+        self.db_path = db_path
         self.max_memory_size = Config.MAX_MEMORY_SIZE
+        with closing(self._connect()) as conn, conn:
+            # WAL lets workers read while another one writes
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS chat_memory ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT, "
+                "user TEXT, ai TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS chat_memory_session ON chat_memory (session_id, id)")
+    
+    def _connect(self):
+        """Open a new connection, so memory can be used from worker threads."""
+        return sqlite3.connect(self.db_path, timeout=10)
     
     def add_to_memory(self, session_id, user_message, ai_response):
         """Add conversation to memory with a limit of MAX_MEMORY_SIZE."""
-        if session_id not in self.chat_memory:
-            self.chat_memory[session_id] = deque(maxlen=self.max_memory_size)
-        
-        self.chat_memory[session_id].append({
-            'user': user_message,
-            'ai': ai_response,
-            'timestamp': str(os.times())
-        })
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "INSERT INTO chat_memory (session_id, user, ai) VALUES (?, ?, ?)",
+                (session_id, user_message, ai_response)
+            )
+            # Keep only the most recent exchanges
+            conn.execute(
+                "DELETE FROM chat_memory WHERE session_id = ? AND id NOT IN "
+                "(SELECT id FROM chat_memory WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                (session_id, session_id, self.max_memory_size)
+            )
     
     def get_conversation_context(self, session_id):
         """Get conversation history for context."""
-        if session_id not in self.chat_memory:
-            return ""
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT user, ai FROM chat_memory WHERE session_id = ? ORDER BY id",
+                (session_id,)
+            ).fetchall()
         
-        context = "PREVIOUS CONVERSATION:\n"
-        for entry in self.chat_memory[session_id]:
-            context += f"User: {entry['user']}\n"
-            context += f"AI: {entry['ai']}\n\n"
+        if not rows:
+            return ""
         
-        return context
+        parts = ["PREVIOUS CONVERSATION:\n"]
+        parts.extend(f"User: {user}\nAI: {ai}\n\n" for user, ai in rows)
+        return "".join(parts)
     
     def clear_memory(self, session_id):
         """Clear chat memory for a specific session."""
-        if session_id in self.chat_memory:
-            del self.chat_memory[session_id]
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM chat_memory WHERE session_id = ?", (session_id,))
     
     def get_memory_stats(self, session_id):
         """Get memory statistics for a session."""
-        if session_id not in self.chat_memory:
-            return {'count': 0, 'max_size': self.max_memory_size}
+        with closing(self._connect()) as conn:
+            (count,) = conn.execute(
+                "SELECT COUNT(*) FROM chat_memory WHERE session_id = ?", (session_id,)
+            ).fetchone()
         
         return {
-            'count': len(self.chat_memory[session_id]),
+            'count': count,
             'max_size': self.max_memory_size
         }
     
     def get_all_sessions(self):
         """Get all active session IDs."""
-        return list(self.chat_memory.keys())
\ No newline at end of file
+        with closing(self._connect()) as conn:
+            return [row[0] for row in conn.execute("SELECT DISTINCT session_id FROM chat_memory")]
@@ -0,0 +1,102 @@
+import os
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config import Config
+
+
+def _hub_model_name(model_name):
+    """Resolve a sentence-transformers short name to its Hugging Face Hub ID."""
+    return model_name if '/' in model_name else f"sentence-transformers/{model_name}"
+
+
+def export_quantized_model(model_name=Config.EMBEDDING_MODEL, save_dir=Config.ONNX_MODEL_DIR):
+    """Export the embedding model to ONNX and apply dynamic int8 quantization."""
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    hub_name = _hub_model_name(model_name)
+    model = ORTModelForFeatureExtraction.from_pretrained(hub_name, export=True)
+    AutoTokenizer.from_pretrained(hub_name).save_pretrained(save_dir)
+
+    # Dynamic int8 quantization uses VNNI dot-product instructions where available
+    quantizer = ORTQuantizer.from_pretrained(model)
+    quantizer.quantize(
+        save_dir=save_dir,
+        quantization_config=AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+    )
+    return save_dir
+
+
+class OnnxEmbeddings(Embeddings):
+    """LangChain embeddings backed by an int8-quantized model in an ONNX Runtime session."""
+
+    def __init__(self, model_dir=Config.ONNX_MODEL_DIR, batch_size=Config.EMBEDDING_BATCH_SIZE):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        if not os.path.isdir(model_dir):
+            print(f"Exporting quantized ONNX embedding model to '{model_dir}'...")
+            export_quantized_model(save_dir=model_dir)
+
+        # Use the GPU when ONNX Runtime was built with CUDA support
+        if 'CUDAExecutionProvider' in onnxruntime.get_available_providers():
+            providers = ['CUDAExecutionProvider', 'CPUExecutionProvider']
+        else:
+            providers = ['CPUExecutionProvider']
+
+        # Full graph optimization fuses attention and layer-norm ops
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = Config.EMBEDDING_THREADS
+
+        self.batch_size = batch_size
+        # Truncate where sentence-transformers does, not at the tokenizer's 512, so both
+        # backends embed long inputs the same way
+        self.max_length = Config.EMBEDDING_MAX_TOKENS
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, 'model_quantized.onnx'),
+            sess_options=options,
+            providers=providers
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def _embed(self, texts):
+        """Embed a batch of texts with mean pooling and L2 normalization."""
+        if not texts:
+            return []
+
+        # Batch similar-length texts together so little compute goes to padding
+        order = np.argsort([len(text) for text in texts], kind='stable')
+
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = [texts[i] for i in order[start:start + self.batch_size]]
+            inputs = self.tokenizer(batch, padding=True, truncation=True, max_length=self.max_length,
+                                    return_tensors='np')
+            feed = {name: array.astype(np.int64) for name, array in inputs.items() if name in self.input_names}
+            hidden = self.session.run(None, feed)[0]
+
+            mask = inputs['attention_mask'][..., np.newaxis].astype(hidden.dtype)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.linalg.norm(pooled, axis=1, keepdims=True)
+            vectors.append(pooled)
+
+        # Restore the input order with the inverse permutation
+        inverse = np.empty_like(order)
+        inverse[order] = np.arange(len(order))
+        return np.concatenate(vectors)[inverse].tolist()
+
+    def embed_documents(self, texts):
+        """Embed a list of documents."""
+        return self._embed(list(texts))
+
+    def embed_query(self, text):
+        """Embed a single query."""
+        return self._embed([text])[0]
+
+
+if __name__ == '__main__':
+    print(f"Quantized model saved to '{export_quantized_model()}'.")
@@ -1,5 +1,6 @@
 import re
 import os
+import hashlib
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -7,13 +8,62 @@ from reportlab.lib.enums import TA_LEFT, TA_CENTER, TA_JUSTIFY
 from reportlab.lib import colors
 from config import Config
 
+# Line classification patterns, compiled once at import
+_MAIN_HEADING_PATTERNS = [re.compile(p) for p in (
+    r'^#+\s+',  # Markdown headings
+    r'^[A-Z][A-Z\s]{3,}:?\s*$',  # ALL CAPS headings
+    r'^\d+\.\s+[A-Z]',  # Numbered headings like "1. Introduction"
+    r'^[A-Z][a-z\s]+:$',  # Title case with colon
+)]
+
+_SUBHEADING_PATTERNS = [re.compile(p) for p in (
+    r'^#{2,}\s+',  # Markdown subheadings
+    r'^\d+\.\d+\s+',  # Numbered subheadings like "1.1 Overview"
+    r'^[A-Z][a-z]+\s+[A-Z][a-z]+:$',  # Two-word titles with colon
+)]
+
+_BULLET_PATTERNS = [re.compile(p) for p in (
+    r'^[-•*]\s+',  # Dash, bullet, or asterisk
+    r'^\s*[-•*]\s+',  # With leading whitespace
+    r'^○\s+',  # Circle bullet
+    r'^►\s+',  # Arrow bullet
+)]
+
+_NUMBERED_PATTERNS = [re.compile(p) for p in (
+    r'^\d+\.\s+',  # 1. Item
+    r'^\d+\)\s+',  # 1) Item
+    r'^\(\d+\)\s+',  # (1) Item
+)]
+
+# All of the above in one alternation; the named group that matches is the line type
+_LINE_RE = re.compile(
+    r'(?P<heading>#+\s+|[A-Z][A-Z\s]{3,}:?\s*$|\d+\.\s+[A-Z]|[A-Z][a-z\s]+:$)'
+    r'|(?P<subheading>#{2,}\s+|\d+\.\d+\s+|[A-Z][a-z]+\s+[A-Z][a-z]+:$)'
+    r'|(?P<bullet>[-•*]\s+|\s*[-•*]\s+|○\s+|►\s+)'
+    r'|(?P<numbered>\d+\.\s+|\d+\)\s+|\(\d+\)\s+)'
+)
+
+# Cleanup patterns; the optional groups strip markers in the same order
+# as the separate substitutions they replace
+_HEADING_MARKER = re.compile(r'^#+\s*')
+_TRAILING_COLON = re.compile(r':$')
+_WHITESPACE = re.compile(r'\s+')
+_BULLET_PREFIX = re.compile(r'^(?:[-•*○►]\s*)?(?:\s*[-•*○►]\s*)?')
+_NUMBER_PREFIX = re.compile(r'^(?:\d+\.\s*)?(?:\d+\)\s*)?(?:\(\d+\)\s*)?')
+
 
 def create_enhanced_pdf_summary(content, filename):
     """Create a well-formatted PDF file with summary content."""
-    output_path = os.path.join(Config.DOWNLOAD_FOLDER, f"summary_{filename}")
+    # Identical summaries map to the same file, so repeat requests skip the build
+    key = hashlib.sha256((filename + content).encode('utf-8')).hexdigest()[:16]
+    output_path = os.path.join(Config.DOWNLOAD_FOLDER, f"summary_{key}_{filename}")
+    if os.path.exists(output_path):
+        return output_path
     
+    # Build under a temporary name so a half-written file is never served
+    tmp_path = output_path + '.tmp'
     doc = SimpleDocTemplate(
-        output_path, 
+        tmp_path, 
         pagesize=letter,
         rightMargin=72,
         leftMargin=72,
@@ -95,6 +145,7 @@ def create_enhanced_pdf_summary(content, filename):
     story.extend(processed_content)
     
     doc.build(story)
+    os.replace(tmp_path, output_path)
     return output_path
 
 
@@ -116,8 +167,10 @@ def format_content_for_pdf(content, styles):
                 story.append(Spacer(1, 6))
             continue
         
-        # Check for different formatting patterns
-        if is_main_heading(line):
+        # Classify the line with a single regex match
+        kind = classify_line(line)
+        
+        if kind == 'heading':
             # Reset list counter for new sections
             current_list_type = None
             list_counter = 0
@@ -126,7 +179,7 @@ def format_content_for_pdf(content, styles):
             para = Paragraph(heading_text, styles['CustomHeading'])
             story.append(para)
             
-        elif is_subheading(line):
+        elif kind == 'subheading':
             current_list_type = None
             list_counter = 0
             
@@ -134,13 +187,13 @@ def format_content_for_pdf(content, styles):
             para = Paragraph(subheading_text, styles['CustomSubheading'])
             story.append(para)
             
-        elif is_bullet_point(line):
+        elif kind == 'bullet':
             current_list_type = 'bullet'
             bullet_text = clean_bullet_text(line)
             para = Paragraph(f"• {bullet_text}", styles['CustomBullet'])
             story.append(para)
             
-        elif is_numbered_point(line):
+        elif kind == 'numbered':
             if current_list_type != 'numbered':
                 current_list_type = 'numbered'
                 list_counter = 0
@@ -163,109 +216,151 @@ def format_content_for_pdf(content, styles):
     return story
 
 
+def _is_short_title(line):
+    """Check if it's a short line (likely heading) with title case."""
+    return len(line) < 50 and len(line.split()) <= 6 and line[0].isupper()
+
+
+def classify_line(line):
+    """
+    Classify a line as 'heading', 'subheading', 'bullet', 'numbered' or
+    'paragraph', with the same precedence as the is_* checks below.
+    """
+    match = _LINE_RE.match(line)
+    kind = match.lastgroup if match else 'paragraph'
+    
+    # The short-title heuristic outranks everything but the heading patterns
+    if kind != 'heading' and _is_short_title(line):
+        return 'heading'
+    return kind
+
+
 def is_main_heading(line):
     """Check if line is a main heading."""
-    heading_patterns = [
-        r'^#+\s+',  # Markdown headings
-        r'^[A-Z][A-Z\s]{3,}:?\s*$',  # ALL CAPS headings
-        r'^\d+\.\s+[A-Z]',  # Numbered headings like "1. Introduction"
-        r'^[A-Z][a-z\s]+:$',  # Title case with colon
-    ]
-    
-    for pattern in heading_patterns:
-        if re.match(pattern, line):
-            return True
-    
-    # Check if it's a short line (likely heading) with title case
-    if len(line) < 50 and len(line.split()) <= 6 and line[0].isupper():
+    if any(pattern.match(line) for pattern in _MAIN_HEADING_PATTERNS):
         return True
     
-    return False
+    return _is_short_title(line)
 
 
 def is_subheading(line):
     """Check if line is a subheading."""
-    subheading_patterns = [
-        r'^#{2,}\s+',  # Markdown subheadings
-        r'^\d+\.\d+\s+',  # Numbered subheadings like "1.1 Overview"
-        r'^[A-Z][a-z]+\s+[A-Z][a-z]+:$',  # Two-word titles with colon
-    ]
-    
-    for pattern in subheading_patterns:
-        if re.match(pattern, line):
-            return True
-    
-    return False
+    return any(pattern.match(line) for pattern in _SUBHEADING_PATTERNS)
 
 
 def is_bullet_point(line):
     """Check if line is a bullet point."""
-    bullet_patterns = [
-        r'^[-•*]\s+',  # Dash, bullet, or asterisk
-        r'^\s*[-•*]\s+',  # With leading whitespace
-        r'^○\s+',  # Circle bullet
-        r'^►\s+',  # Arrow bullet
-    ]
-    
-    for pattern in bullet_patterns:
-        if re.match(pattern, line):
-            return True
-    
-    return False
+    return any(pattern.match(line) for pattern in _BULLET_PATTERNS)
 
 
 def is_numbered_point(line):
     """Check if line is a numbered list item."""
-    numbered_patterns = [
-        r'^\d+\.\s+',  # 1. Item
-        r'^\d+\)\s+',  # 1) Item
-        r'^\(\d+\)\s+',  # (1) Item
-    ]
-    
-    for pattern in numbered_patterns:
-        if re.match(pattern, line):
-            return True
-    
-    return False
+    return any(pattern.match(line) for pattern in _NUMBERED_PATTERNS)
 
 
 def clean_heading_text(line):
     """Clean heading text by removing formatting markers."""
     # Remove markdown headers
-    line = re.sub(r'^#+\s*', '', line)
+    line = _HEADING_MARKER.sub('', line)
     # Remove trailing colons
-    line = re.sub(r':$', '', line)
+    line = _TRAILING_COLON.sub('', line)
     # Clean up extra whitespace
-    line = re.sub(r'\s+', ' ', line).strip()
+    line = _WHITESPACE.sub(' ', line).strip()
     return line
 
 
 def clean_bullet_text(line):
     """Clean bullet point text."""
     # Remove bullet markers
-    line = re.sub(r'^[-•*○►]\s*', '', line)
-    line = re.sub(r'^\s*[-•*○►]\s*', '', line)
-    return line.strip()
+    return _BULLET_PREFIX.sub('', line).strip()
 
 
 def clean_numbered_text(line):
     """Clean numbered list text."""
     # Remove numbering
-    line = re.sub(r'^\d+\.\s*', '', line)
-    line = re.sub(r'^\d+\)\s*', '', line)
-    line = re.sub(r'^\(\d+\)\s*', '', line)
-    return line.strip()
+    return _NUMBER_PREFIX.sub('', line).strip()
+
+
+def _is_word_char(char):
+    """Match the semantics of the regex \\w class for a single character."""
+    return char.isalnum() or char == '_'
+
+
+def _replace_delimited(text, delimiter, open_tag, close_tag):
+    """
+    Wrap each delimiter(.*?)delimiter span in tags, scanning left to right
+    with str.find. If an opening delimiter has no closing one, no later
+    delimiter can have one either, so the scan stops there.
+    """
+    size = len(delimiter)
+    parts = []
+    pos = 0
+    while True:
+        start = text.find(delimiter, pos)
+        if start == -1:
+            break
+        end = text.find(delimiter, start + size)
+        if end == -1:
+            break
+        parts.append(text[pos:start])
+        parts.append(open_tag)
+        parts.append(text[start + size:end])
+        parts.append(close_tag)
+        pos = end + size
+    
+    if not parts:
+        return text
+    parts.append(text[pos:])
+    return ''.join(parts)
+
+
+def _replace_underscore_italics(text):
+    """
+    Wrap _italic_ spans whose underscores are not inside a word, e.g. in
+    file names. Equivalent to (?<!\\w)_(.*?)_(?!\\w).
+    """
+    length = len(text)
+    parts = []
+    pos = 0
+    start = text.find('_')
+    while start != -1:
+        if start > 0 and _is_word_char(text[start - 1]):
+            start = text.find('_', start + 1)
+            continue
+        
+        # Nearest closing underscore that is not followed by a word character
+        end = text.find('_', start + 1)
+        while end != -1 and end + 1 < length and _is_word_char(text[end + 1]):
+            end = text.find('_', end + 1)
+        if end == -1:
+            break
+        
+        parts.append(text[pos:start])
+        parts.append('<i>')
+        parts.append(text[start + 1:end])
+        parts.append('</i>')
+        pos = end + 1
+        start = text.find('_', pos)
+    
+    if not parts:
+        return text
+    parts.append(text[pos:])
+    return ''.join(parts)
 
 
 def format_inline_text(text):
     """Format inline text for bold, italic, etc."""
+    if '\n' in text:
+        # Markers never pair up across lines
+        return '\n'.join(format_inline_text(line) for line in text.split('\n'))
+    
     # Handle **bold** text
-    text = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', text)
+    text = _replace_delimited(text, '**', '<b>', '</b>')
     # Handle *italic* text
-    text = re.sub(r'\*(.*?)\*', r'<i>\1</i>', text)
+    text = _replace_delimited(text, '*', '<i>', '</i>')
     # Handle __bold__ text
-    text = re.sub(r'__(.*?)__', r'<b>\1</b>', text)
+    text = _replace_delimited(text, '__', '<b>', '</b>')
     # Handle _italic_ text (but not if it's part of filename)
-    text = re.sub(r'(?<![\w])_(.*?)_(?![\w])', r'<i>\1</i>', text)
+    text = _replace_underscore_italics(text)
     
-    return text
\ No newline at end of file
+    return text
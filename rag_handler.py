@@ -1,102 +1,202 @@
-from langchain_community.document_loaders import PyPDFLoader
+import os
+import json
+import atexit
+import asyncio
+import hashlib
+import functools
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import httpx
+import fitz
+import numpy as np
+import torch
+from transformers import AutoTokenizer
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_community.vectorstores import Chroma
-from langchain.prompts import PromptTemplate
+from langchain_core.prompts import ChatPromptTemplate
 from langchain_deepseek import ChatDeepSeek
 from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain.chains import create_retrieval_chain
+from langchain_community.cache import SQLiteCache
+from langchain_core.globals import set_llm_cache
+from langchain_core.runnables import ConfigurableField
 
 from config import Config
-from utils import get_available_files
+from binary_retriever import BinaryIndex, BinaryQuantizedRetriever
+from embedding_cache import EmbeddingCache
+from semantic_cache import SemanticCache
+from onnx_embeddings import OnnxEmbeddings, _hub_model_name
+from utils import get_available_files, compute_file_hash, mentions_file
 
+try:
+    import fcntl
+except ImportError:  # Windows: manifest writes are only serialized within a process
+    fcntl = None
 
-class RAGHandler:
-    """Handles RAG (Retrieval-Augmented Generation) operations."""
-    
-    def __init__(self):
-        self.vectorstore = None
-        self.rag_chain = None
-        self.embeddings = None
-        self.llm = None
-    
-    def reset_vectorstore(self):
-        """Reset the vector store to force rebuild."""
-        self.vectorstore = None
-        self.rag_chain = None
-    
-    def get_vectorstore(self):
-        """
-        Processes all PDF documents in the 'uploads' folder and creates
-        or updates a Chroma vector store with file metadata.
-        """
-        if self.vectorstore is not None:
-            print("Vector store already exists. Not rebuilding.")
-            return self.vectorstore
+# Shared splitter; chunks are measured with the embedding model's own tokenizer
+# so each one fits its input window and nothing is truncated at embed time.
+# The length count excludes the two special tokens the model adds, which
+# CHUNK_SIZE leaves room for.
+TEXT_SPLITTER = RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+    AutoTokenizer.from_pretrained(_hub_model_name(Config.EMBEDDING_MODEL)),
+    chunk_size=Config.CHUNK_SIZE,
+    chunk_overlap=Config.CHUNK_OVERLAP
+)
 
-        print("Building vector store from documents in the 'uploads' directory...")
+# Files indexed with different chunking settings are re-split on the next load
+CHUNKING_KEY = f"{Config.EMBEDDING_MODEL}:{Config.CHUNK_SIZE}:{Config.CHUNK_OVERLAP}"
 
-        # Check for existing PDFs in the uploads folder
-        pdf_files = get_available_files()
-        if not pdf_files:
-            print("No PDF files found in the 'uploads' directory. Skipping vector store creation.")
-            return None
+# Fallback reply when the chain produces no answer; never cached
+NO_ANSWER = "Sorry, I could not find a relevant answer in your documents."
 
-        # Load documents from the uploads folder with metadata
-        documents = []
-        for file_info in pdf_files:
-            file_path = file_info['path']
-            filename = file_info['filename']
-            
-            loader = PyPDFLoader(file_path)
-            docs = loader.load()
-            
-            # Add filename metadata to each document chunk
-            for doc in docs:
-                doc.metadata['source_filename'] = filename
-                doc.metadata['file_path'] = file_path
+
+@functools.lru_cache(maxsize=None)
+def _warn_ocr_unavailable(reason):
+    """Print, once per process, why scanned pages are indexed without text."""
+    print(f"OCR is unavailable ({reason}); scanned pages will be indexed without text.")
+
+
+def _ocr_page(file_path, page_number):
+    """OCR a scanned page with pypdfium2 and Tesseract, if they are installed."""
+    try:
+        import pypdfium2
+        import pytesseract
+    except ImportError as e:
+        _warn_ocr_unavailable(f"{e.name} is not installed")
+        return ""
+    
+    pdf = pypdfium2.PdfDocument(file_path)
+    try:
+        image = pdf[page_number].render(scale=300 / 72).to_pil()
+        return pytesseract.image_to_string(image)
+    except pytesseract.TesseractNotFoundError:
+        _warn_ocr_unavailable("the tesseract binary is not installed")
+        return ""
+    finally:
+        pdf.close()
+
+
+def _iter_pdf_pages(file_path, filename):
+    """Yield one document per PDF page, extracted with PyMuPDF's C parser."""
+    with fitz.open(file_path) as pdf:
+        for page_number, page in enumerate(pdf):
+            text = page.get_text("text")
+            if not text.strip():
+                # No text layer, most likely a scanned page
+                text = _ocr_page(file_path, page_number)
             
-            documents.extend(docs)
+            yield Document(
+                page_content=text,
+                metadata={
+                    'source': file_path,
+                    'page': page_number,
+                    'source_filename': filename,
+                    'file_path': file_path
+                }
+            )
 
-        if not documents:
-            print("No content could be extracted from the PDF files.")
-            return None
 
-        # Split the documents into chunks
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=Config.CHUNK_SIZE, 
-            chunk_overlap=Config.CHUNK_OVERLAP
-        )
-        docs = text_splitter.split_documents(documents)
+def _chunk_id(doc):
+    """Stable ID for a chunk, derived from its text and where it came from."""
+    key = f"{doc.metadata['source_filename']}\0{doc.metadata.get('page', '')}\0{doc.page_content}"
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
 
-        # Create embeddings and the vector store
-        if not self.embeddings:
-            self.embeddings = HuggingFaceEmbeddings(model_name=Config.EMBEDDING_MODEL)
-        
-        self.vectorstore = Chroma.from_documents(documents=docs, embedding=self.embeddings)
 
-        print("Vector store created successfully.")
-        return self.vectorstore
+def _load_and_split_pdf(file_path, filename):
+    """
+    Load a PDF and split it into chunks, page by page as it is parsed
+    (module-level so worker processes can run it).
+    """
+    return [
+        chunk
+        for page in _iter_pdf_pages(file_path, filename)
+        for chunk in TEXT_SPLITTER.split_documents([page])
+    ]
+
+
+class MultiGPUEmbeddings(Embeddings):
+    """
+    Embeds queries on a single-device model and bulk documents in a
+    sentence-transformers pool with one process per GPU, started once.
+    """
     
-    def create_rag_chain(self):
-        """Create the RAG chain with prompt template."""
-        if self.rag_chain is not None:
-            return self.rag_chain
-        
-        if not self.llm:
-            self.llm = ChatDeepSeek(model=Config.LLM_MODEL, api_key=Config.DEEPSEEK_API_KEY)
+    def __init__(self, embeddings, batch_size):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self._pool = None
+        self._pool_lock = threading.Lock()
+    
+    def _get_pool(self):
+        """Start the per-GPU worker pool on first use and stop it at exit."""
+        with self._pool_lock:
+            if self._pool is None:
+                client = self.embeddings._client
+                self._pool = client.start_multi_process_pool()
+                atexit.register(client.stop_multi_process_pool, self._pool)
+            return self._pool
+    
+    def embed_documents(self, texts):
+        """Embed documents across all GPUs, normalized like the single-device path."""
+        vectors = self.embeddings._client.encode_multi_process(
+            list(texts), self._get_pool(), batch_size=self.batch_size
+        )
+        # The pool ignores encode_kwargs, so normalize here
+        vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors.tolist()
+    
+    def embed_query(self, text):
+        """Embed a single query on one device; a pool round trip would cost more than it saves."""
+        return self.embeddings.embed_query(text)
 
-        # Create a retriever from the vector store
-        retriever = self.vectorstore.as_retriever()
 
-        # Get available files for the prompt
-        available_files = get_available_files()
-        file_list = [f"- {f['filename']}" for f in available_files]
-        files_context = "\n".join(file_list)
+def create_embeddings():
+    """Create the embedder with batched, device-aware encoding."""
+    if Config.EMBEDDING_BACKEND == 'onnx':
+        return OnnxEmbeddings()
+    
+    use_cuda = torch.cuda.is_available()
+    model_kwargs = {"device": "cuda" if use_cuda else "cpu"}
+    if use_cuda:
+        # fp16 halves memory traffic on the GPU; CPU kernels stay in fp32
+        model_kwargs["model_kwargs"] = {"torch_dtype": torch.float16}
+    else:
+        # Let MKL/OpenMP use every core (or PDFIQ_THREADS) for the transformer's matmuls
+        torch.set_num_threads(Config.EMBEDDING_THREADS)
+    
+    batch_size = Config.EMBEDDING_BATCH_SIZE_GPU if use_cuda else Config.EMBEDDING_BATCH_SIZE
+    embeddings = HuggingFaceEmbeddings(
+        model_name=Config.EMBEDDING_MODEL,
+        model_kwargs=model_kwargs,
+        encode_kwargs={
+            "batch_size": batch_size,
+            "normalize_embeddings": True,
+            "convert_to_numpy": True,
+            "show_progress_bar": False
+        }
+    )
+    
+    if use_cuda and torch.cuda.device_count() > 1:
+        # With several GPUs, bulk document encoding runs in a per-device process pool
+        return MultiGPUEmbeddings(embeddings, batch_size)
+    
+    if Config.EMBEDDING_COMPILE and use_cuda:
+        # Fuse the transformer's kernels; the first batches pay the compile cost
+        transformer = embeddings._client[0]
+        transformer.auto_model = torch.compile(transformer.auto_model, mode="reduce-overhead")
+    
+    return embeddings
+
 
-        # Enhanced prompt template with file operations and memory
-        prompt_template = PromptTemplate.from_template(
-            f"""You are PDF-IQ, an intelligent document assistant with access to multiple PDF files and conversation memory.
+# Enhanced prompt with file operations and memory, parsed once per process.
+# The file list is a template variable so uploads don't require a new prompt.
+SYSTEM_PROMPT = """You are PDF-IQ, an intelligent document assistant with access to multiple PDF files and conversation memory.
 
 AVAILABLE FILES:
 {files_context}
@@ -134,22 +234,464 @@ FILENAME: [exact filename if download/summary requested]
 SUMMARY_CONTENT: [well-structured summary with proper headings, bullet points, and formatting when DOWNLOAD_SUMMARY is true]
 
 ANSWER: [Your detailed answer here, always mentioning which file(s) the information comes from]
+"""
 
-{{conversation_context}}
+HUMAN_PROMPT = """{conversation_context}
 
 CONTEXT FROM DOCUMENTS:
-{{context}}
+{context}
 
-USER QUESTION: {{input}}
+USER QUESTION: {input}
 """
+
+PROMPT = ChatPromptTemplate.from_messages([
+    ("system", SYSTEM_PROMPT),
+    ("human", HUMAN_PROMPT)
+])
+
+
+# Loaded once per process on first use, so a preloading Gunicorn master never
+# holds the model weights and each worker loads them after the fork
+_EMBEDDINGS = None
+_EMBEDDINGS_LOCK = threading.Lock()
+
+
+def get_embeddings():
+    """Return the process-wide embedder, creating it on first use."""
+    global _EMBEDDINGS
+    with _EMBEDDINGS_LOCK:
+        if _EMBEDDINGS is None:
+            _EMBEDDINGS = create_embeddings()
+        return _EMBEDDINGS
+
+
+class LazyEmbeddings(Embeddings):
+    """
+    Stand-in for the shared embedder that loads the model on the first embed
+    call, so opening an up-to-date vector store does not load it at all.
+    """
+    
+    def embed_documents(self, texts):
+        """Embed a list of documents."""
+        return get_embeddings().embed_documents(texts)
+    
+    def embed_query(self, text):
+        """Embed a single query."""
+        return get_embeddings().embed_query(text)
+
+
+class RAGHandler:
+    """Handles RAG (Retrieval-Augmented Generation) operations."""
+    
+    def __init__(self):
+        self.vectorstore = None
+        self.rag_chain = None
+        self.embeddings = LazyEmbeddings()
+        self.llm = None
+        self.retriever = None
+        self.binary_index = None
+        self.combine_docs_chain = None
+        self._retriever_for = None
+        self._pdf_files = None
+        self._files_context = ""
+        self.qa_cache = SemanticCache()
+        self.embedding_cache = EmbeddingCache()
+        self._index_lock = threading.RLock()
+        self.manifest = self._load_manifest()
+        # Entries changed since the last save (filename -> entry, or None if removed)
+        self._manifest_changes = {}
+    
+    def reset_vectorstore(self):
+        """Reset the vector store to force rebuild."""
+        self.vectorstore = None
+        self.rag_chain = None
+        self._pdf_files = None
+    
+    def preload(self):
+        """
+        Index any new uploads once, in a spawned child process, before workers
+        fork. The parent never loads the model, CUDA or a Chroma connection,
+        so forked workers inherit nothing they cannot safely use.
+        """
+        process = multiprocessing.get_context('spawn').Process(target=_index_uploads)
+        process.start()
+        process.join()
+        if process.exitcode != 0:
+            print(f"Preloading the vector store failed (exit code {process.exitcode}).")
+        
+        # Pick up the files the child indexed
+        self._reload_manifest()
+    
+    def open_indexed(self):
+        """Open the already indexed store and build the chain, without indexing new uploads."""
+        with self._index_lock:
+            if not get_available_files():
+                return False
+            
+            self._open_vectorstore()
+            if self.vectorstore._collection.count() == 0:
+                # Nothing was indexed up front; the first question indexes instead
+                self.reset_vectorstore()
+                return False
+            
+            self.create_rag_chain()
+            return True
+    
+    def _open_vectorstore(self):
+        """Open the persistent Chroma collection, creating it if needed."""
+        if self.vectorstore is not None:
+            return self.vectorstore
+        
+        self.vectorstore = Chroma(
+            collection_name=Config.VECTORSTORE_COLLECTION,
+            persist_directory=Config.VECTORSTORE_FOLDER,
+            embedding_function=self.embeddings,
+            collection_metadata=Config.VECTORSTORE_HNSW
         )
+        return self.vectorstore
+    
+    def _is_indexed(self, doc_hash, filename):
+        """Check whether this file's current content is already indexed under its name."""
+        # Scoped to the filename: a copy uploaded under another name needs its own
+        # chunks, or deleting the original would take the copy's content with it
+        where = {'$and': [{'doc_hash': doc_hash}, {'source_filename': filename}]}
+        result = self.vectorstore.get(where=where, limit=1)
+        return bool(result['ids'])
+    
+    def _load_manifest(self):
+        """Load the manifest of indexed files (filename -> size, mtime, doc_hash, chunking)."""
+        try:
+            with open(Config.VECTORSTORE_MANIFEST, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+    
+    def _reload_manifest(self):
+        """Replace the in-memory manifest with the one on disk, dropping unsaved changes."""
+        self.manifest = self._load_manifest()
+        self._manifest_changes = {}
+    
+    def _set_manifest_entry(self, filename, entry):
+        """Record a file's entry (or its removal, if None) to be merged on the next save."""
+        if entry is None:
+            self.manifest.pop(filename, None)
+        else:
+            self.manifest[filename] = entry
+        self._manifest_changes[filename] = entry
+    
+    @staticmethod
+    @contextmanager
+    def _manifest_file_lock():
+        """Hold an exclusive lock on the manifest across processes, where fcntl is available."""
+        if fcntl is None:
+            yield
+            return
+        with open(Config.VECTORSTORE_MANIFEST + '.lock', 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def _save_manifest(self):
+        """
+        Merge this process's changes into the manifest on disk and write it
+        atomically. Other processes may have saved their own files since this
+        one last read it, so the on-disk copy is re-read under a file lock.
+        """
+        with self._manifest_file_lock():
+            manifest = self._load_manifest()
+            for filename, entry in self._manifest_changes.items():
+                if entry is None:
+                    manifest.pop(filename, None)
+                else:
+                    manifest[filename] = entry
+            
+            tmp_path = Config.VECTORSTORE_MANIFEST + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(manifest, f)
+            os.replace(tmp_path, Config.VECTORSTORE_MANIFEST)
+        
+        self.manifest = manifest
+        self._manifest_changes = {}
+    
+    def _find_new_files(self, pdf_files):
+        """
+        Return the files whose content is not yet indexed, with their hashes.
+        Files whose size and mtime match the manifest are skipped without
+        being read.
+        """
+        new_files = []
+        for file_info in pdf_files:
+            stat = os.stat(file_info['path'])
+            entry = self.manifest.get(file_info['filename'])
+            rechunk = entry is not None and entry.get('chunking') != CHUNKING_KEY
+            if entry and not rechunk and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                continue
+            
+            doc_hash = compute_file_hash(file_info['path'])
+            if rechunk or not self._is_indexed(doc_hash, file_info['filename']):
+                new_files.append((file_info, doc_hash))
+            
+            self._set_manifest_entry(file_info['filename'], {
+                'size': stat.st_size,
+                'mtime': stat.st_mtime,
+                'doc_hash': doc_hash,
+                'chunking': CHUNKING_KEY
+            })
+        return new_files
+    
+    def _prune_removed_files(self, pdf_files):
+        """Drop chunks of files that were indexed but are no longer in the uploads folder."""
+        current = {file_info['filename'] for file_info in pdf_files}
+        removed = [filename for filename in self.manifest if filename not in current]
+        for filename in removed:
+            self.vectorstore._collection.delete(where={'source_filename': filename})
+            self._set_manifest_entry(filename, None)
+        
+        if removed:
+            print(f"Removed {len(removed)} deleted file(s) from the vector store.")
+    
+    def _load_new_chunks(self, new_files):
+        """
+        Load and split new PDFs, parsing and splitting several files in parallel
+        worker processes. Returns the chunks and their IDs.
+        """
+        if not new_files:
+            return [], []
+        
+        for file_info, _ in new_files:
+            # Drop chunks left over from a previous version of the same file
+            self.vectorstore._collection.delete(where={'source_filename': file_info['filename']})
+        
+        if len(new_files) > 1:
+            # Parse and split each file in its own worker process, collecting in completion order.
+            # Spawned, not forked: this runs in a threaded process that holds torch and Chroma.
+            max_workers = min(8, os.cpu_count() or 1, len(new_files))
+            split = [None] * len(new_files)
+            mp_context = multiprocessing.get_context('spawn')
+            with ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context) as executor:
+                futures = {
+                    executor.submit(_load_and_split_pdf, file_info['path'], file_info['filename']): i
+                    for i, (file_info, _) in enumerate(new_files)
+                }
+                for future in as_completed(futures):
+                    split[futures[future]] = future.result()
+        else:
+            file_info = new_files[0][0]
+            split = [_load_and_split_pdf(file_info['path'], file_info['filename'])]
+        
+        all_docs, all_ids = [], []
+        seen_ids = set()
+        for (file_info, doc_hash), docs in zip(new_files, split):
+            if not docs:
+                print(f"No content could be extracted from {file_info['filename']}.")
+                continue
+            
+            for doc in docs:
+                doc.metadata['doc_hash'] = doc_hash
+                
+                # Content-derived IDs make re-ingesting the same chunk idempotent
+                chunk_id = _chunk_id(doc)
+                if chunk_id in seen_ids:
+                    continue
+                seen_ids.add(chunk_id)
+                
+                all_docs.append(doc)
+                all_ids.append(chunk_id)
+        
+        return all_docs, all_ids
+    
+    def _add_chunks(self, docs, ids):
+        """Embed chunks slice by slice and add each slice to the collection."""
+        if not docs:
+            return
+        
+        texts = [doc.page_content for doc in docs]
+        metadatas = [doc.metadata for doc in docs]
+        
+        # Bounded slices keep each Chroma write and embedding batch small
+        batch_size = Config.CHROMA_BATCH_SIZE
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            with torch.inference_mode():
+                vectors = self.embedding_cache.embed_documents(texts[start:end], self.embeddings)
+            
+            self.vectorstore._collection.add(
+                ids=ids[start:end],
+                embeddings=vectors,
+                documents=texts[start:end],
+                metadatas=metadatas[start:end]
+            )
+    
+    def _index_files(self, pdf_files):
+        """Index the given files that are new or changed. Returns the number of chunks added."""
+        try:
+            docs, ids = self._load_new_chunks(self._find_new_files(pdf_files))
+            self._add_chunks(docs, ids)
+            if self.binary_index is not None:
+                self.binary_index.invalidate()
+        except Exception:
+            # Forget unsaved manifest entries so the files are retried
+            self._reload_manifest()
+            raise
+        
+        self._save_manifest()
+        return len(docs)
+    
+    def get_vectorstore(self):
+        """
+        Opens the persistent Chroma vector store and indexes any PDF
+        documents in the 'uploads' folder that are not already in it.
+        """
+        if self.vectorstore is not None:
+            print("Vector store already exists. Not rebuilding.")
+            return self.vectorstore
+
+        # Serialize indexing; background ingests and requests may race here
+        with self._index_lock:
+            if self.vectorstore is not None:
+                return self.vectorstore
+
+            # Check for existing PDFs in the uploads folder
+            pdf_files = get_available_files()
+            if not pdf_files:
+                print("No PDF files found in the 'uploads' directory. Skipping vector store creation.")
+                return None
+
+            print("Loading vector store and indexing new documents from the 'uploads' directory...")
+            # Start from what every process has indexed, not this one's copy from the fork
+            self._reload_manifest()
+            self._open_vectorstore()
+            self._prune_removed_files(pdf_files)
 
-        # Create the retrieval chain
-        combine_docs_chain = create_stuff_documents_chain(self.llm, prompt_template)
-        self.rag_chain = create_retrieval_chain(retriever, combine_docs_chain)
+            added = self._index_files(pdf_files)
+            self.vectorstore.persist()
+
+            if self.vectorstore._collection.count() == 0:
+                print("No content could be extracted from the PDF files.")
+                self.reset_vectorstore()
+                return None
+
+            print(f"Vector store ready ({added} new chunks indexed).")
+            return self.vectorstore
+    
+    def ingest_file(self, file_path, filename):
+        """Load, split, embed and index a single newly uploaded PDF."""
+        with self._index_lock:
+            if self.vectorstore is None:
+                # Opening the store indexes every new upload, this one included
+                self.get_vectorstore()
+                self.qa_cache.clear()
+                return
+            
+            file_info = {'filename': filename, 'path': file_path}
+            self._reload_manifest()
+            self._index_files([file_info])
+            self.vectorstore.persist()
+            self.qa_cache.clear()
+    
+    def is_indexed(self, filename):
+        """Whether a file has been indexed, by any process sharing the persisted store."""
+        return filename in self._load_manifest()
+    
+    def remove_file(self, filename):
+        """Drop all chunks belonging to a deleted PDF from the vector store."""
+        with self._index_lock:
+            self._open_vectorstore()
+            self.vectorstore._collection.delete(where={'source_filename': filename})
+            self.vectorstore.persist()
+            if self.binary_index is not None:
+                self.binary_index.invalidate()
+            self._set_manifest_entry(filename, None)
+            self._save_manifest()
+            self.qa_cache.clear()
+            
+            if not get_available_files():
+                self.reset_vectorstore()
+    
+    def create_rag_chain(self):
+        """Create the RAG chain, reusing the LLM and document chain across rebuilds."""
+        if self.rag_chain is not None and self._retriever_for == id(self.vectorstore):
+            return self.rag_chain
+        
+        if not self.llm:
+            # A pooled HTTP client keeps TLS sessions to the API alive between requests.
+            # There is no shared async client: Flask runs each async view in its own
+            # short-lived event loop, and connections from a closed loop cannot be reused.
+            limits = httpx.Limits(max_keepalive_connections=Config.LLM_MAX_CONNECTIONS)
+            self.llm = ChatDeepSeek(
+                model=Config.LLM_MODEL,
+                api_key=Config.DEEPSEEK_API_KEY,
+                http_client=httpx.Client(limits=limits)
+            )
+            # Exact-match cache for LLM calls with an identical prompt. Opened here rather
+            # than at import so each worker gets its own SQLite connection after the fork.
+            set_llm_cache(SQLiteCache(database_path=Config.LLM_CACHE_PATH))
+            self.combine_docs_chain = create_stuff_documents_chain(self.llm, PROMPT)
+
+        # Only rebuild the retriever when the vector store itself was replaced
+        if self._retriever_for != id(self.vectorstore):
+            if Config.RETRIEVER_BINARY_QUANTIZATION:
+                # Hamming-distance shortlist over sign bits, rescored with exact cosine
+                self.binary_index = BinaryIndex(self.vectorstore._collection)
+                retriever = BinaryQuantizedRetriever(
+                    index=self.binary_index,
+                    embeddings=self.embeddings,
+                    search_kwargs=dict(Config.RETRIEVER_SEARCH_KWARGS)
+                )
+            else:
+                # MMR retriever
+                retriever = self.vectorstore.as_retriever(
+                    search_type=Config.RETRIEVER_SEARCH_TYPE,
+                    search_kwargs=dict(Config.RETRIEVER_SEARCH_KWARGS)
+                )
+            
+            # Search kwargs can be overridden per request
+            self.retriever = retriever.configurable_fields(
+                search_kwargs=ConfigurableField(id="search_kwargs")
+            )
+            self._retriever_for = id(self.vectorstore)
+
+        # Create the retrieval chain; the configurable wrapper is not a BaseRetriever,
+        # so create_retrieval_chain would hand it the whole input dict without this
+        self.rag_chain = create_retrieval_chain(itemgetter("input") | self.retriever, self.combine_docs_chain)
         
         return self.rag_chain
     
+    def _build_input(self, question, conversation_context):
+        """Build the per-request chain input, including the current file list."""
+        return {
+            "input": question,
+            "conversation_context": conversation_context,
+            "files_context": self._get_files_context()
+        }
+    
+    def _get_files_context(self):
+        """The prompt's file list, rebuilt only when the upload index changes."""
+        pdf_files = get_available_files()
+        if pdf_files is not self._pdf_files:
+            self._pdf_files = pdf_files
+            self._files_context = "\n".join(f"- {f['filename']}" for f in pdf_files)
+        return self._files_context
+    
+    def _retrieval_config(self, question):
+        """Restrict retrieval to the files mentioned in the question, if any."""
+        mentioned = [
+            f['filename'] for f in get_available_files()
+            if mentions_file(question, f['filename'])
+        ]
+        if not mentioned:
+            return None
+        
+        if len(mentioned) == 1:
+            where = {'source_filename': mentioned[0]}
+        else:
+            where = {'source_filename': {'$in': mentioned}}
+        
+        search_kwargs = dict(Config.RETRIEVER_SEARCH_KWARGS, filter=where)
+        return {"configurable": {"search_kwargs": search_kwargs}}
+    
     def initialize(self):
         """Initialize the RAG system."""
         vectorstore = self.get_vectorstore()
@@ -164,11 +706,68 @@ USER QUESTION: {{input}}
         if not self.rag_chain:
             raise ValueError("RAG chain not initialized. Call initialize() first.")
         
-        # Include conversation context in the input
-        full_input = {
-            "input": question,
-            "conversation_context": conversation_context
-        }
+        # Include conversation context and the file list in the input
+        full_input = self._build_input(question, conversation_context)
+        
+        # Serve repeated or paraphrased questions from the semantic cache
+        self.qa_cache.set_version(full_input["files_context"])
+        answer = self.qa_cache.get_exact(question, conversation_context)
+        if answer is not None:
+            return answer
         
-        response = self.rag_chain.invoke(full_input)
-        return response.get("answer", "Sorry, I could not find a relevant answer in your documents.")
\ No newline at end of file
+        vector = self.embeddings.embed_query(question)
+        answer = self.qa_cache.get_similar(vector, conversation_context)
+        if answer is not None:
+            return answer
+        
+        response = self.rag_chain.invoke(full_input, config=self._retrieval_config(question))
+        answer = response.get("answer")
+        if not answer:
+            # Not cached, so a transient failure is retried on the next ask
+            return NO_ANSWER
+        
+        self.qa_cache.add(question, vector, answer, conversation_context)
+        return answer
+    
+    async def aget_response(self, question, conversation_context=""):
+        """
+        Get response from the RAG system without blocking the event loop.
+        The synchronous chain runs in a thread, so the LLM's pooled HTTP client
+        is never tied to an event loop that Flask closes after the request.
+        """
+        return await asyncio.to_thread(self.get_response, question, conversation_context)
+    
+    def stream_response(self, question, conversation_context=""):
+        """Stream the answer from the RAG system token by token."""
+        if not self.rag_chain:
+            raise ValueError("RAG chain not initialized. Call initialize() first.")
+        
+        full_input = self._build_input(question, conversation_context)
+        
+        self.qa_cache.set_version(full_input["files_context"])
+        answer = self.qa_cache.get_exact(question, conversation_context)
+        if answer is None:
+            vector = self.embeddings.embed_query(question)
+            answer = self.qa_cache.get_similar(vector, conversation_context)
+        if answer is not None:
+            yield answer
+            return
+        
+        tokens = []
+        for chunk in self.rag_chain.stream(full_input, config=self._retrieval_config(question)):
+            token = chunk.get("answer")
+            if token:
+                tokens.append(token)
+                yield token
+        
+        if not tokens:
+            # Not cached, so a transient empty stream is retried on the next ask
+            yield NO_ANSWER
+            return
+        
+        self.qa_cache.add(question, vector, ''.join(tokens), conversation_context)
+
+
+def _index_uploads():
+    """Entry point of the preload process: index new uploads, then exit."""
+    RAGHandler().get_vectorstore()
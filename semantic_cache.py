@@ -0,0 +1,139 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from config import Config
+
+
+class SemanticCache:
+    """
+    In-memory cache of answers, matched first by an exact hash of the
+    normalized question and conversation, then by cosine similarity of
+    question embeddings within the same conversation. Entries expire after a TTL.
+    """
+
+    def __init__(self, max_entries=Config.QA_CACHE_SIZE, min_similarity=Config.QA_CACHE_MIN_SIMILARITY,
+                 ttl=Config.QA_CACHE_TTL):
+        self.max_entries = max_entries
+        self.min_similarity = min_similarity
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._version = None
+        self.clear()
+
+    @staticmethod
+    def _key(question, conversation_context=""):
+        """Hash a question and its conversation, ignoring case and whitespace in the question."""
+        normalized = ' '.join(question.lower().split())
+        key = f"{normalized}|{conversation_context}"
+        return hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+
+    @staticmethod
+    def _context_id(conversation_context):
+        """64-bit hash of a conversation, stored per row to scope similarity matches."""
+        digest = hashlib.blake2b(conversation_context.encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'little')
+
+    def clear(self):
+        """Drop all cached answers."""
+        with self._lock:
+            # Exact matches, least recently used first: key -> (answer, expiry)
+            self._exact = OrderedDict()
+            self._answers = []
+            # Preallocated rows of normalized question vectors; the first _n are in use
+            self._matrix = None
+            self._expiry = None
+            self._contexts = None
+            self._n = 0
+            self._next = 0
+
+    def set_version(self, version):
+        """Clear the cache when the corpus it was built against has changed."""
+        with self._lock:
+            if version != self._version:
+                self._version = version
+                self.clear()
+
+    def get_exact(self, question, conversation_context=""):
+        """Return the answer cached for this exact question and conversation, or None."""
+        key = self._key(question, conversation_context)
+        with self._lock:
+            entry = self._exact.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self._exact[key]
+                return None
+            self._exact.move_to_end(key)
+            return entry[0]
+
+    def get_similar(self, vector, conversation_context=""):
+        """
+        Return the answer of the most similar cached question asked in the
+        same conversation, if it is above the threshold, or None.
+        """
+        context_id = self._context_id(conversation_context)
+        query = np.array(vector, dtype=np.float32)
+        query /= np.linalg.norm(query)
+
+        with self._lock:
+            if not self._n:
+                return None
+
+            # One matrix-vector product scores every cached question
+            scores = self._matrix[:self._n] @ query
+            scores[self._expiry[:self._n] < time.monotonic()] = -np.inf
+            # Follow-ups like "tell me more" depend on the conversation they were asked in
+            scores[self._contexts[:self._n] != context_id] = -np.inf
+            best = int(scores.argmax())
+            if scores[best] >= self.min_similarity:
+                return self._answers[best]
+            return None
+
+    def _grow(self, dim):
+        """Double the matrix capacity, up to max_entries rows."""
+        capacity = 0 if self._matrix is None else len(self._matrix)
+        new_capacity = min(max(16, capacity * 2), self.max_entries)
+        matrix = np.empty((new_capacity, dim), dtype=np.float32)
+        expiry = np.empty(new_capacity, dtype=np.float64)
+        contexts = np.empty(new_capacity, dtype=np.uint64)
+        if capacity:
+            matrix[:capacity] = self._matrix
+            expiry[:capacity] = self._expiry
+            contexts[:capacity] = self._contexts
+        self._matrix = matrix
+        self._expiry = expiry
+        self._contexts = contexts
+
+    def add(self, question, vector, answer, conversation_context=""):
+        """Cache an answer under its question, conversation and question embedding."""
+        key = self._key(question, conversation_context)
+        row = np.array(vector, dtype=np.float32)
+        row /= np.linalg.norm(row)
+        expires = time.monotonic() + self.ttl
+        context_id = self._context_id(conversation_context)
+
+        with self._lock:
+            self._exact[key] = (answer, expires)
+            self._exact.move_to_end(key)
+            while len(self._exact) > self.max_entries:
+                self._exact.popitem(last=False)
+
+            if self._n < self.max_entries:
+                if self._matrix is None or self._n == len(self._matrix):
+                    self._grow(len(row))
+                slot = self._n
+                self._n += 1
+                self._answers.append(answer)
+            else:
+                # Full: overwrite the oldest entry
+                slot = self._next
+                self._next = (slot + 1) % self.max_entries
+                self._answers[slot] = answer
+
+            self._matrix[slot] = row
+            self._expiry[slot] = expires
+            self._contexts[slot] = context_id
@@ -0,0 +1,56 @@
+import pytest
+
+pytest.importorskip("langchain")
+pytest.importorskip("langchain_core")
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.vectorstores import InMemoryVectorStore
+from langchain.chains.combine_documents import create_stuff_documents_chain
+
+try:
+    import rag_handler
+except (ImportError, OSError) as e:
+    # The module loads the embedding tokenizer at import
+    pytest.skip(f"rag_handler could not be imported: {e}", allow_module_level=True)
+
+
+@pytest.fixture
+def handler(monkeypatch):
+    """A RAGHandler over an in-memory store and a fake LLM."""
+    monkeypatch.setattr(rag_handler, "get_available_files", lambda: [
+        {'filename': 'alpha.pdf', 'size': 1, 'path': 'uploads/alpha.pdf'}
+    ])
+
+    store = InMemoryVectorStore(DeterministicFakeEmbedding(size=16))
+    store.add_documents([
+        Document(page_content="Alpha covers the quarterly budget.", metadata={'source_filename': 'alpha.pdf'}),
+        Document(page_content="Beta covers the hiring plan.", metadata={'source_filename': 'beta.pdf'}),
+    ])
+
+    llm = FakeListChatModel(responses=["DOWNLOAD_ORIGINAL: false\nANSWER: From alpha.pdf."])
+
+    handler = rag_handler.RAGHandler()
+    handler.vectorstore = store
+    handler.llm = llm
+    handler.combine_docs_chain = create_stuff_documents_chain(llm, rag_handler.PROMPT)
+    handler.create_rag_chain()
+    return handler
+
+
+def test_chain_retrieves_with_the_question_text(handler):
+    full_input = handler._build_input("What is the budget?", "")
+    response = handler.rag_chain.invoke(full_input)
+
+    assert response["answer"] == "DOWNLOAD_ORIGINAL: false\nANSWER: From alpha.pdf."
+    assert response["context"]
+    assert all(isinstance(doc, Document) for doc in response["context"])
+
+
+def test_chain_accepts_per_request_search_kwargs(handler):
+    full_input = handler._build_input("What is the budget?", "")
+    config = {"configurable": {"search_kwargs": {"k": 1, "fetch_k": 2}}}
+    response = handler.rag_chain.invoke(full_input, config=config)
+
+    assert len(response["context"]) == 1
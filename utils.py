@@ -1,26 +1,152 @@
 import os
+import re
+import hashlib
+import functools
+import threading
 from config import Config
 
+_ALLOWED_SUFFIXES = tuple(f'.{ext}' for ext in Config.ALLOWED_EXTENSIONS)
+_SIZE_UNITS = ("B", "KB", "MB", "GB", "TB")
 
+# One field of the structured AI response, from its key up to the next key
+_OPERATION_KEYS = r'DOWNLOAD_ORIGINAL|DOWNLOAD_SUMMARY|FILENAME|SUMMARY_CONTENT|ANSWER'
+_OPERATION_RE = re.compile(
+    rf'^[^\S\n]*({_OPERATION_KEYS}):(.*?)(?=^[^\S\n]*(?:{_OPERATION_KEYS}):|\Z)',
+    re.M | re.S
+)
+
+# In-memory index of uploaded PDFs (filename -> metadata), rebuilt when the
+# uploads folder's mtime changes (e.g. a file added by another worker)
+_upload_index = None
+_upload_index_mtime = None
+_upload_list = None  # sorted view of the index, shared until the index changes
+_upload_index_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=256)
 def allowed_file(filename):
     """Checks if the uploaded file has a valid extension."""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
+    return filename.lower().endswith(_ALLOWED_SUFFIXES)
 
 
-def get_available_files():
-    """Get list of available PDF files with metadata."""
-    pdf_files = []
+@functools.lru_cache(maxsize=256)
+def _mention_pattern(filename):
+    """Pattern matching a file's full name or its stem as a whole word."""
+    stem = os.path.splitext(filename)[0]
+    names = '|'.join(re.escape(name) for name in {filename, stem} if name)
+    return re.compile(rf'(?<!\w)(?:{names})(?!\w)', re.IGNORECASE)
+
+
+def mentions_file(question, filename):
+    """Check whether a question refers to a file by its name or stem."""
+    return _mention_pattern(filename).search(question) is not None
+
+
+def compute_file_hash(file_path):
+    """Compute the SHA-256 hash of a file's contents."""
+    sha256 = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def _scan_uploads():
+    """Scan the uploads folder for PDF files with a single stat per entry."""
+    files = {}
     if os.path.exists(Config.UPLOAD_FOLDER):
-        for filename in os.listdir(Config.UPLOAD_FOLDER):
-            if filename.endswith('.pdf'):
-                file_path = os.path.join(Config.UPLOAD_FOLDER, filename)
-                file_size = os.path.getsize(file_path)
-                pdf_files.append({
-                    'filename': filename,
-                    'size': file_size,
-                    'path': file_path
-                })
-    return pdf_files
+        with os.scandir(Config.UPLOAD_FOLDER) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith('.pdf'):
+                    files[entry.name] = {
+                        'filename': entry.name,
+                        'size': entry.stat().st_size,
+                        'path': entry.path
+                    }
+    return files
+
+
+def _uploads_mtime():
+    """Modification time of the uploads folder, or None if it does not exist."""
+    try:
+        return os.stat(Config.UPLOAD_FOLDER).st_mtime
+    except FileNotFoundError:
+        return None
+
+
+def get_available_files():
+    """
+    Get list of available PDF files with metadata from the in-memory index.
+    The same list object is returned until the index changes; do not modify it.
+    """
+    global _upload_index, _upload_index_mtime, _upload_list
+    mtime = _uploads_mtime()
+    with _upload_index_lock:
+        if _upload_index is None or mtime != _upload_index_mtime:
+            _upload_index = _scan_uploads()
+            _upload_index_mtime = mtime
+            _upload_list = None
+        if _upload_list is None:
+            _upload_list = [_upload_index[name] for name in sorted(_upload_index)]
+        return _upload_list
+
+
+def register_upload(filename):
+    """Add or refresh a file in the upload index."""
+    file_path = os.path.join(Config.UPLOAD_FOLDER, filename)
+    if not filename.endswith('.pdf') or not os.path.isfile(file_path):
+        return
+    
+    global _upload_list
+    with _upload_index_lock:
+        if _upload_index is not None:
+            _upload_list = None
+            _upload_index[filename] = {
+                'filename': filename,
+                'size': os.path.getsize(file_path),
+                'path': file_path
+            }
+
+
+def unregister_upload(filename):
+    """Remove a file from the upload index."""
+    global _upload_list
+    with _upload_index_lock:
+        if _upload_index is not None:
+            _upload_list = None
+            _upload_index.pop(filename, None)
+
+
+def start_upload_watcher():
+    """Keep the upload index in sync with files changed outside the app (requires watchdog)."""
+    try:
+        from watchdog.observers import Observer
+        from watchdog.events import FileSystemEventHandler
+    except ImportError:
+        print("watchdog is not installed; files added outside the app appear after a restart.")
+        return None
+
+    class UploadEventHandler(FileSystemEventHandler):
+        def on_created(self, event):
+            if not event.is_directory:
+                register_upload(os.path.basename(event.src_path))
+
+        on_modified = on_created
+
+        def on_deleted(self, event):
+            if not event.is_directory:
+                unregister_upload(os.path.basename(event.src_path))
+
+        def on_moved(self, event):
+            if not event.is_directory:
+                unregister_upload(os.path.basename(event.src_path))
+                register_upload(os.path.basename(event.dest_path))
+
+    observer = Observer()
+    observer.schedule(UploadEventHandler(), Config.UPLOAD_FOLDER)
+    observer.daemon = True
+    observer.start()
+    return observer
 
 
 def get_downloads_files():
@@ -47,29 +173,27 @@ def extract_file_operation(response_text):
         'summary_content': None
     }
     
-    lines = response_text.split('\n')
-    current_section = None
-    summary_lines = []
-    
-    for line in lines:
-        line = line.strip()
-        if line.startswith('DOWNLOAD_ORIGINAL:'):
-            operations['download_original'] = line.split(':', 1)[1].strip().lower() == 'true'
-        elif line.startswith('DOWNLOAD_SUMMARY:'):
-            operations['download_summary'] = line.split(':', 1)[1].strip().lower() == 'true'
-        elif line.startswith('FILENAME:'):
-            operations['filename'] = line.split(':', 1)[1].strip()
-        elif line.startswith('SUMMARY_CONTENT:'):
-            current_section = 'summary'
-            # Get content after the colon
-            content_after_colon = line.split(':', 1)[1].strip()
-            if content_after_colon:
-                summary_lines.append(content_after_colon)
-        elif current_section == 'summary' and line and not line.startswith('ANSWER:'):
-            summary_lines.append(line)
-        elif line.startswith('ANSWER:'):
-            current_section = 'answer'
+    summary_lines = None
+    for match in _OPERATION_RE.finditer(response_text):
+        key, value = match.group(1), match.group(2)
+        if key == 'ANSWER':
             break
+        
+        # Field values are single-line; anything after belongs to an open summary
+        first_line, _, rest = value.partition('\n')
+        if key == 'DOWNLOAD_ORIGINAL':
+            operations['download_original'] = first_line.strip().lower() == 'true'
+        elif key == 'DOWNLOAD_SUMMARY':
+            operations['download_summary'] = first_line.strip().lower() == 'true'
+        elif key == 'FILENAME':
+            operations['filename'] = first_line.strip()
+        else:
+            if summary_lines is None:
+                summary_lines = []
+            rest = value
+        
+        if summary_lines is not None:
+            summary_lines.extend(line.strip() for line in rest.split('\n') if line.strip())
     
     # Join summary lines with newlines to preserve formatting
     if summary_lines:
@@ -80,30 +204,28 @@ def extract_file_operation(response_text):
 
 def format_response_with_links(clean_answer, download_links):
     """Add download links to the AI response for display in chat."""
-    formatted_response = clean_answer
+    parts = [clean_answer]
     
     if download_links:
-        formatted_response += "\n\n📎 **Download Links:**\n"
+        parts.append("\n\n📎 **Download Links:**\n")
         
         if 'original' in download_links:
-            filename = download_links['original'].split('/')[-1]
-            formatted_response += f"• [📄 Download Original PDF: {filename}]({download_links['original']})\n"
+            original = download_links['original']
+            parts.append(f"• [📄 Download Original PDF: {os.path.basename(original)}]({original})\n")
         
         if 'summary' in download_links:
-            filename = download_links['summary'].split('/')[-1]
-            formatted_response += f"• [📋 Download Summary PDF: {filename}]({download_links['summary']})\n"
+            summary = download_links['summary']
+            parts.append(f"• [📋 Download Summary PDF: {os.path.basename(summary)}]({summary})\n")
     
-    return formatted_response
+    return "".join(parts)
 
 
 def format_file_size(size_bytes):
     """Format file size in human readable format."""
-    if size_bytes == 0:
+    if size_bytes <= 0:
         return "0B"
     
-    size_names = ["B", "KB", "MB", "GB"]
-    import math
-    i = int(math.floor(math.log(size_bytes, 1024)))
-    p = math.pow(1024, i)
-    s = round(size_bytes / p, 2)
-    return f"{s} {size_names[i]}"
\ No newline at end of file
+    # bit_length gives floor(log2), so every 10 bits is one 1024x unit step
+    i = min((size_bytes.bit_length() - 1) // 10, len(_SIZE_UNITS) - 1)
+    s = round(size_bytes / (1 << (10 * i)), 2)
+    return f"{s} {_SIZE_UNITS[i]}"
@@ -1,10 +1,14 @@
 #!/usr/bin/python3.4
 """
 WSGI configuration for PDF-IQ on PythonAnywhere
+
+Serve it from a single process: uploads and deletes write to Chroma's
+PersistentClient, which is not process-safe.
 """
 
 import sys
 import os
+import multiprocessing
 
 # Add your project directory to the Python path
 project_home = '/home/yourusername/pdf-rag'
@@ -12,7 +16,39 @@ if project_home not in sys.path:
     sys.path.insert(0, project_home)
 
 # Import your Flask application
-from app import app as application
+from app import app as application, start_background_tasks
+
+
+def _python_executable():
+    """
+    The Python interpreter of this environment. Under uWSGI, sys.executable is
+    the uwsgi binary, which cannot run the children that multiprocessing spawns.
+    """
+    if os.path.basename(sys.executable).startswith('python'):
+        return sys.executable
+    for name in (f'python{sys.version_info.major}.{sys.version_info.minor}', 'python3', 'python'):
+        path = os.path.join(sys.exec_prefix, 'bin', name)
+        if os.path.exists(path):
+            return path
+    return sys.executable
+
+
+# Preloading and PDF parsing spawn worker processes
+multiprocessing.set_executable(_python_executable())
+
+
+def preload():
+    """
+    Index any new uploads once, before the server starts its workers, so
+    each worker only opens the persisted vector store instead of embedding.
+    """
+    try:
+        application.config['RAG'].preload()
+    except Exception as e:
+        print(f"Could not preload the vector store: {e}")
+
+preload()
+start_background_tasks()
 
 if __name__ == "__main__":
     application.run()